@@ -1,18 +1,25 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
+import asyncio
 import os
-import hashlib
+import re
+from blake3 import blake3
+from functools import lru_cache
+from typing import Any, Dict, Tuple
 
 from services.geocoding_service import GeocodingService
 from services.gemini_service import GeminiService
 from services.transport_service import TransportService
 from scrapers.reddit_scraper import RedditScraper
-from utils.cache import Cache
+from utils.aio import run_sync
+from utils.cache import create_cache
+from utils.json_provider import OrjsonProvider
 
 load_dotenv()
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, resources={
     r"/*": {
         "origins": [
@@ -29,7 +36,103 @@ geocoding_service = GeocodingService()
 gemini_service = GeminiService()
 transport_service = TransportService()
 reddit_scraper = RedditScraper()
-cache = Cache()
+cache = create_cache()
+
+# Bump when the prompt or response shape changes to invalidate cached analyses
+CACHE_VERSION = "v1"
+
+# Trailing ", Paris", ", France", ", Paris, France" (any casing/spacing)
+_CITY_SUFFIX_RE = re.compile(r"(?:\s*,\s*(?:paris|france))+[\s,]*$")
+
+def _normalize_address(address: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation and city/country."""
+    normalized = " ".join(address.lower().split())
+    normalized = _CITY_SUFFIX_RE.sub("", normalized)
+    return normalized.rstrip(" ,")
+
+@lru_cache(maxsize=4096)
+def _geo_cache_key(address: str) -> str:
+    """Geocoding cache key for an address. Memoized since addresses recur."""
+    normalized = _normalize_address(address)
+    return f"{CACHE_VERSION}:geo:{blake3(normalized.encode()).hexdigest(length=16)}"
+
+def _location_key(latitude: float, longitude: float) -> str:
+    """Coordinates rounded to 5 decimals (~1 m) so nearby lookups share entries."""
+    return f"{latitude:.5f}:{longitude:.5f}"
+
+def _cached(key: str, pending: Dict[str, Any], fn, *args):
+    """
+    Return the cached value for key, calling fn(*args) on a miss.
+    New values are added to pending, to be written with one cache.set_many.
+    """
+    value = cache.get(key)
+    if value is None:
+        value = fn(*args)
+        if value:
+            pending[key] = value
+    return value
+
+async def _cached_async(key: str, pending: Dict[str, Any], fn, *args):
+    """Like _cached, for a coroutine function."""
+    value = await asyncio.to_thread(cache.get, key)
+    if value is None:
+        value = await fn(*args)
+        if value:
+            pending[key] = value
+    return value
+
+async def _gather_insights(address: str, geo_data: Dict, pending: Dict[str, Any]) -> Tuple[Dict, Dict, Dict]:
+    """
+    Fetch transport, Reddit and Gemini data for a geocoded address.
+    Transport and Reddit run concurrently; Gemini waits for both.
+    Returns (transport, reddit, analysis); analysis is None on failure.
+    New cache entries are added to pending.
+    """
+    latitude = geo_data.get("latitude")
+    longitude = geo_data.get("longitude")
+    arrondissement = geo_data.get("arrondissement")
+    location = _location_key(latitude, longitude)
+
+    # Transport only depends on coordinates; start it right away
+    transport_task = asyncio.create_task(_cached_async(
+        f"{CACHE_VERSION}:transport:{location}",
+        pending,
+        transport_service.analyze_connectivity_async,
+        latitude,
+        longitude
+    ))
+
+    # Reddit insights and Gemini analysis are cached together per location
+    analysis_key = f"{CACHE_VERSION}:analysis:{arrondissement}:{location}"
+    cached_analysis = await asyncio.to_thread(cache.get, analysis_key)
+    if cached_analysis:
+        return await transport_task, cached_analysis["reddit"], cached_analysis["analysis"]
+
+    transport_data, reddit_data = await asyncio.gather(
+        transport_task,
+        reddit_scraper.get_neighborhood_insights_async(arrondissement, geo_data.get("neighborhood"))
+    )
+
+    # Prepare data for Gemini analysis
+    neighborhood_data = {
+        "address": address,
+        "arrondissement": arrondissement,
+        "neighborhood": geo_data.get("neighborhood"),
+        "district": geo_data.get("district"),
+        "coordinates": {
+            "latitude": latitude,
+            "longitude": longitude
+        },
+        "transport": transport_data,
+        "reddit": reddit_data
+    }
+
+    # Get AI analysis
+    analysis = await gemini_service.analyze_neighborhood_async(neighborhood_data)
+    if analysis:
+        pending[analysis_key] = {"reddit": reddit_data, "analysis": analysis}
+
+    return transport_data, reddit_data, analysis
 
 @app.route("/")
 def home():
@@ -52,49 +155,19 @@ def analyze_address():
     if not address:
         return jsonify({"error": "Address is required"}), 400
 
-    # Create cache key based on address
-    cache_key = f"analysis_{hashlib.md5(address.lower().encode()).hexdigest()}"
-
-    # Check cache first
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        return jsonify(cached_result)
-
-    # Geocode the address
-    geo_data = geocoding_service.geocode_address(address)
-    if not geo_data:
-        return jsonify({"error": "Address not found in Paris"}), 404
-
-    # Get transport connectivity analysis
-    transport_data = transport_service.analyze_connectivity(
-        geo_data.get("latitude"),
-        geo_data.get("longitude")
-    )
-
-    # Get Reddit insights for neighborhood
-    reddit_data = reddit_scraper.get_neighborhood_insights(
-        geo_data.get("arrondissement"),
-        geo_data.get("neighborhood")
-    )
-
-    # Prepare data for Gemini analysis
-    neighborhood_data = {
-        "address": address,
-        "arrondissement": geo_data.get("arrondissement"),
-        "neighborhood": geo_data.get("neighborhood"),
-        "district": geo_data.get("district"),
-        "coordinates": {
-            "latitude": geo_data.get("latitude"),
-            "longitude": geo_data.get("longitude")
-        },
-        "transport": transport_data,
-        "reddit": reddit_data
-    }
+    # Cache writes for this request, flushed together at the end
+    pending = {}
+    try:
+        # Geocode the address
+        geo_data = _cached(_geo_cache_key(address), pending, geocoding_service.geocode_address, address)
+        if not geo_data:
+            return jsonify({"error": "Address not found in Paris"}), 404
 
-    # Get AI analysis
-    analysis = gemini_service.analyze_neighborhood(neighborhood_data)
-    if not analysis:
-        return jsonify({"error": "Failed to analyze neighborhood"}), 500
+        transport_data, reddit_data, analysis = run_sync(_gather_insights(address, geo_data, pending))
+        if not analysis:
+            return jsonify({"error": "Failed to analyze neighborhood"}), 500
+    finally:
+        cache.set_many(pending)
 
     # Build response
     result = {
@@ -105,9 +178,6 @@ def analyze_address():
         "analysis": analysis
     }
 
-    # Cache the result
-    cache.set(cache_key, result)
-
     return jsonify(result)
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+import os
+
+# Run with: gunicorn -c gunicorn.conf.py wsgi:app
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+
+# gevent workers multiplex the outbound HTTP calls (Nominatim, Reddit, Gemini)
+# that dominate each request. Routes must stay synchronous (no async def).
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+worker_connections = 1000
+timeout = 60
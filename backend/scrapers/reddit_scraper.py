@@ -1,10 +1,60 @@
-import requests
+import asyncio
+import atexit
+import httpx
+import orjson
 from bs4 import BeautifulSoup
-import time
 import os
+import time
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
 from typing import List, Dict
 from datetime import datetime
 
+from utils.aio import run_sync
+from utils.retry import MAX_RETRY_WAIT_SECONDS, wait_retry_after
+from utils.text import truncate
+
+# Max Reddit searches in flight at once (across all requests)
+MAX_CONCURRENT_SEARCHES = 8
+
+_search_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+
+# Limit to top 3 queries for faster response
+MAX_QUERIES = 3
+
+# Top 15 most relevant posts
+MAX_POSTS = 15
+
+
+def _arrondissement_queries(arrondissement: int) -> List[str]:
+    """All search queries for an arrondissement, most relevant first."""
+    arr_variations = [
+        f"{arrondissement}",
+        f"{arrondissement}th",
+        f"{arrondissement}e",
+        f"75{arrondissement:02d}"  # Postal code format
+    ]
+
+    queries = []
+    for arr in arr_variations:
+        queries.append(f"living {arr} arrondissement")
+        queries.append(f"moving to {arr} arrondissement")
+        queries.append(f"{arr} arrondissement safe")
+        queries.append(f"{arr} arrondissement neighborhood")
+
+    return queries
+
+
+# Truncation limits when formatting posts for Gemini
+MAX_POST_CHARS = 300
+MAX_COMMENT_CHARS = 200
+
+
+# Only 20 arrondissements, so their top queries are precomputed once
+_QUERIES_BY_ARR = {
+    arr: tuple(_arrondissement_queries(arr)[:MAX_QUERIES])
+    for arr in range(1, 21)
+}
+
 class RedditScraper:
     """
     Scrapes r/paris for neighborhood insights and resident experiences.
@@ -18,10 +68,31 @@ class RedditScraper:
         }
         self.base_url = "https://www.reddit.com"
 
+        # Pooled HTTP/2 client: searches are multiplexed over one connection.
+        # Only used from the shared event loop (utils.aio).
+        self.client = httpx.AsyncClient(
+            http2=True,
+            headers=self.headers,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=32)
+        )
+        atexit.register(lambda: run_sync(self.client.aclose()))
+
+        # Monotonic time before which searches hold off (Reddit quota exhausted)
+        self._resume_at = 0.0
+
     def get_neighborhood_insights(self, arrondissement: int, neighborhood_name: str = None) -> Dict:
         """
         Search r/paris for posts about a specific arrondissement/neighborhood.
         Returns compiled insights from real residents.
+        Sync wrapper around get_neighborhood_insights_async.
+        """
+        return run_sync(self.get_neighborhood_insights_async(arrondissement, neighborhood_name))
+
+    async def get_neighborhood_insights_async(self, arrondissement: int, neighborhood_name: str = None) -> Dict:
+        """
+        Async version of get_neighborhood_insights.
+        All search queries are issued concurrently.
         """
         if not arrondissement:
             return {"posts": [], "summary": "No arrondissement data available"}
@@ -29,21 +100,27 @@ class RedditScraper:
         # Build search queries
         queries = self._build_search_queries(arrondissement, neighborhood_name)
 
-        all_posts = []
-        for query in queries:
-            posts = self._search_posts(query, limit=10)
-            all_posts.extend(posts)
+        tasks = [
+            asyncio.create_task(self._search_posts_async(query, limit=10))
+            for query in queries
+        ]
 
-        # Remove duplicates
-        seen_ids = set()
-        unique_posts = []
-        for post in all_posts:
-            if post["id"] not in seen_ids:
-                seen_ids.add(post["id"])
-                unique_posts.append(post)
+        # Merge results as searches finish, stopping once we have enough distinct posts
+        unique_posts = {}
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                for post in await next_result:
+                    unique_posts.setdefault(post["id"], post)
+                    if len(unique_posts) >= MAX_POSTS:
+                        break
+                if len(unique_posts) >= MAX_POSTS:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
 
         return {
-            "posts": unique_posts[:15],  # Top 15 most relevant posts
+            "posts": list(unique_posts.values()),
             "total_found": len(unique_posts),
             "queries_used": queries
         }
@@ -53,31 +130,18 @@ class RedditScraper:
         Build search queries targeting neighborhood discussions.
         Focus on: living experiences, safety, vibe, recommendations.
         """
-        arr_variations = [
-            f"{arrondissement}",
-            f"{arrondissement}th",
-            f"{arrondissement}e",
-            f"75{arrondissement:02d}"  # Postal code format
-        ]
-
-        queries = []
+        precomputed = _QUERIES_BY_ARR.get(arrondissement)
+        queries = list(precomputed) if precomputed else _arrondissement_queries(arrondissement)[:MAX_QUERIES]
 
-        # Direct arrondissement queries
-        for arr in arr_variations:
-            queries.append(f"living {arr} arrondissement")
-            queries.append(f"moving to {arr} arrondissement")
-            queries.append(f"{arr} arrondissement safe")
-            queries.append(f"{arr} arrondissement neighborhood")
-
-        # If specific neighborhood name provided, add those queries
-        if neighborhood_name:
+        # If specific neighborhood name provided, use it for any remaining slots
+        if neighborhood_name and len(queries) < MAX_QUERIES:
             queries.append(f"living in {neighborhood_name}")
             queries.append(f"{neighborhood_name} neighborhood")
             queries.append(f"moving to {neighborhood_name}")
 
-        return queries[:3]  # Limit to top 3 queries for faster response
+        return queries[:MAX_QUERIES]
 
-    def _search_posts(self, query: str, limit: int = 10) -> List[Dict]:
+    async def _search_posts_async(self, query: str, limit: int = 10) -> List[Dict]:
         """
         Search r/paris for posts matching the query using web scraping.
         Extract title, body, score, and comments.
@@ -94,41 +158,65 @@ class RedditScraper:
                 "limit": limit
             }
 
-            # Make request with delay to respect rate limits
-            time.sleep(0.5)  # Reduced delay for faster responses
-            response = requests.get(
-                search_url,
-                headers=self.headers,
-                params=params,
-                timeout=10
-            )
+            response = await self._fetch_search(search_url, params)
 
             if response.status_code != 200:
                 print(f"Reddit API returned status {response.status_code}")
                 return posts
 
-            data = response.json()
-
-            for post_data in data.get("data", {}).get("children", []):
-                post = post_data.get("data", {})
-
-                # Extract basic post info
-                posts.append({
-                    "id": post.get("id", ""),
-                    "title": post.get("title", ""),
-                    "text": post.get("selftext", ""),
-                    "score": post.get("score", 0),
-                    "num_comments": post.get("num_comments", 0),
-                    "url": f"{self.base_url}{post.get('permalink', '')}",
-                    "created": datetime.fromtimestamp(post.get("created_utc", 0)).strftime("%Y-%m-%d") if post.get("created_utc") else "Unknown",
-                    "top_comments": []  # We'll skip comments for simplicity
-                })
+            # Keep only the listing; the rest of the payload is dropped right away
+            children = orjson.loads(response.content).get("data", {}).get("children", [])
+            posts = [self._project_post(child.get("data", {})) for child in children]
 
         except Exception as e:
             print(f"Reddit search error for '{query}': {e}")
 
         return posts
 
+    @retry(
+        retry=retry_if_exception_type(httpx.HTTPStatusError),
+        wait=wait_retry_after,
+        stop=stop_after_attempt(3),
+        reraise=True
+    )
+    async def _fetch_search(self, search_url: str, params: Dict) -> httpx.Response:
+        """
+        GET a search page, retrying throttled (429) and server (5xx) errors
+        after the delay Reddit asks for, or with exponential backoff.
+        """
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        async with _search_semaphore:
+            response = await self.client.get(search_url, params=params)
+
+        # Out of quota for this window: delay the next searches instead of getting a 429
+        remaining = response.headers.get("X-Ratelimit-Remaining")
+        reset = response.headers.get("X-Ratelimit-Reset")
+        if remaining is not None and reset is not None and float(remaining) < 1:
+            self._resume_at = time.monotonic() + min(float(reset), MAX_RETRY_WAIT_SECONDS)
+
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+
+        return response
+
+    def _project_post(self, post: Dict) -> Dict:
+        """Copy the fields we use out of a raw Reddit post."""
+        created_utc = post.get("created_utc")
+
+        return {
+            "id": post.get("id", ""),
+            "title": post.get("title", ""),
+            "text": post.get("selftext", ""),
+            "score": post.get("score", 0),
+            "num_comments": post.get("num_comments", 0),
+            "url": f"{self.base_url}{post.get('permalink', '')}",
+            "created": datetime.fromtimestamp(created_utc).strftime("%Y-%m-%d") if created_utc else "Unknown",
+            "top_comments": []  # We'll skip comments for simplicity
+        }
+
     def format_for_gemini(self, reddit_data: Dict) -> str:
         """
         Format Reddit insights into a readable text block for Gemini analysis.
@@ -136,26 +224,19 @@ class RedditScraper:
         if not reddit_data.get("posts"):
             return "No Reddit discussions found for this neighborhood."
 
-        formatted = "REDDIT INSIGHTS (Real resident experiences from r/paris):\n\n"
+        parts = ["REDDIT INSIGHTS (Real resident experiences from r/paris):\n\n"]
 
         for i, post in enumerate(reddit_data["posts"][:10], 1):
-            formatted += f"{i}. {post['title']}\n"
+            parts.append(f"{i}. {post['title']}\n")
 
             if post.get("text"):
-                # Truncate long posts
-                text = post["text"][:300]
-                if len(post["text"]) > 300:
-                    text += "..."
-                formatted += f"   Post: {text}\n"
+                parts.append(f"   Post: {truncate(post['text'], MAX_POST_CHARS)}\n")
 
             if post.get("top_comments"):
-                formatted += "   Top comments:\n"
+                parts.append("   Top comments:\n")
                 for comment in post["top_comments"]:
-                    comment_text = comment["text"][:200]
-                    if len(comment["text"]) > 200:
-                        comment_text += "..."
-                    formatted += f"   - {comment_text}\n"
+                    parts.append(f"   - {truncate(comment['text'], MAX_COMMENT_CHARS)}\n")
 
-            formatted += f"   (Score: {post['score']}, Comments: {post['num_comments']})\n\n"
+            parts.append(f"   (Score: {post['score']}, Comments: {post['num_comments']})\n\n")
 
-        return formatted
+        return "".join(parts)
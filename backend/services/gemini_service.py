@@ -1,83 +1,18 @@
 import google.generativeai as genai
 import os
-import json
-from typing import Dict, Optional
-from ratelimit import limits, sleep_and_retry
+import orjson
+from typing import Dict, List, Optional
+from typing_extensions import TypedDict  # typing.TypedDict is rejected by pydantic on < 3.12
 
-class GeminiService:
-    """
-    Handles AI analysis using Google Gemini API (free tier)
-    """
-
-    def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment")
-
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-
-        # Free tier: 15 requests per minute
-        self.rpm_limit = int(os.getenv("GEMINI_RPM_LIMIT", 15))
-
-    @sleep_and_retry
-    @limits(calls=15, period=60)
-    def analyze_neighborhood(self, neighborhood_data: Dict) -> Optional[Dict]:
-        """
-        Returns structured analysis or None on error.
-        """
-        prompt = self._build_analysis_prompt(neighborhood_data)
-
-        try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text
-
-            # Try to parse JSON response
-            # Gemini sometimes wraps JSON in markdown code blocks
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-
-            return json.loads(result_text)
-
-        except Exception as e:
-            print(f"Gemini analysis error: {e}")
-            return None
-
-    def _build_analysis_prompt(self, data: Dict) -> str:
-        """
-        Build a structured prompt for Gemini to analyze the neighborhood.
-        """
-        arrondissement = data.get("arrondissement", "Unknown")
-        address = data.get("address", "Unknown address")
-        transport = data.get("transport", {})
-        reddit = data.get("reddit", {})
-
-        # Build transport context
-        transport_context = ""
-        if transport:
-            connectivity_score = transport.get("connectivity_score", 0)
-            nearby_stations = transport.get("nearby_stations", [])
-            landmark_times = transport.get("landmark_travel_times", [])
-
-            transport_context = f"\n\nTRANSPORT DATA:"
-            transport_context += f"\n- Connectivity Score: {connectivity_score}/5"
-            transport_context += f"\n- Nearby Stations: {len(nearby_stations)} stations within 500m"
-            if nearby_stations:
-                station_list = ", ".join([f"{s['name']} ({s['walk_time_minutes']}min walk)" for s in nearby_stations[:3]])
-                transport_context += f"\n  Including: {station_list}"
-            if landmark_times:
-                transport_context += "\n- Travel times to landmarks:"
-                for lt in landmark_times:
-                    transport_context += f"\n  * {lt['landmark']}: {lt['time']}"
+from utils.aio import run_sync
+from utils.rate_limit import AsyncCallLimiter
+from utils.text import truncate
 
-        # Build Reddit context
-        reddit_context = ""
-        if reddit and reddit.get("posts"):
-            reddit_context = "\n\n" + self._format_reddit_insights(reddit)
+# Free tier: 15 requests per minute (per process)
+_gemini_limiter = AsyncCallLimiter(calls=15, period=60)
 
-        prompt = f"""You are analyzing a Paris neighborhood for someone looking for accommodation.
+# Prompt for analyze_neighborhood (literal JSON braces are doubled for str.format)
+ANALYSIS_PROMPT_TEMPLATE = """You are analyzing a Paris neighborhood for someone looking for accommodation.
 
 Address: {address}
 Arrondissement: {arrondissement}{transport_context}{reddit_context}
@@ -120,19 +55,14 @@ IMPORTANT: Use the actual transport data provided above for connectivity rating
 
 Return ONLY valid JSON, no additional text."""
 
-        return prompt
-
-    def compare_addresses(self, address1_analysis: Dict, address2_analysis: Dict) -> Optional[Dict]:
-        """
-        Compare two addresses and provide recommendation.
-        """
-        prompt = f"""Compare these two Paris neighborhoods for someone choosing accommodation:
+# Prompt for compare_addresses
+COMPARISON_PROMPT_TEMPLATE = """Compare these two Paris neighborhoods for someone choosing accommodation:
 
 Address 1 Analysis:
-{json.dumps(address1_analysis, indent=2)}
+{address1_analysis}
 
 Address 2 Analysis:
-{json.dumps(address2_analysis, indent=2)}
+{address2_analysis}
 
 Provide a comparison in JSON format:
 
@@ -150,16 +80,170 @@ Provide a comparison in JSON format:
 
 Return ONLY valid JSON."""
 
+# Reddit post excerpts are cut to this many characters in the prompt
+MAX_PROMPT_POST_CHARS = 250
+
+
+# Response schemas: Gemini returns raw JSON matching these (structured output mode)
+
+class Overview(TypedDict):
+    description: str
+    three_word_summary: str
+
+
+class Rating(TypedDict):
+    score: int
+    justification: str
+
+
+class Ratings(TypedDict):
+    safety: Rating
+    walkability: Rating
+    nightlife: Rating
+    family_friendly: Rating
+    food_scene: Rating
+    quietness: Rating
+    tourist_density: Rating
+    connectivity: Rating
+
+
+class Recommendations(TypedDict):
+    cafes: List[str]
+    restaurants: List[str]
+    activities: List[str]
+
+
+class NearbyLandmark(TypedDict):
+    name: str
+    travel_time: str
+
+
+class NeighborhoodAnalysis(TypedDict):
+    overview: Overview
+    what_locals_say: List[str]
+    ratings: Ratings
+    highlights: List[str]
+    recommendations: Recommendations
+    nearby_landmarks: List[NearbyLandmark]
+
+
+class BetterFor(TypedDict):
+    families: str
+    nightlife: str
+    safety: str
+    budget: str
+    tourists: str
+    quiet_living: str
+
+
+class AddressComparison(TypedDict):
+    better_for: BetterFor
+    overall_recommendation: str
+
+
+ANALYSIS_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=NeighborhoodAnalysis
+)
+
+COMPARISON_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=AddressComparison
+)
+
+class GeminiService:
+    """
+    Handles AI analysis using Google Gemini API (free tier)
+    """
+
+    def __init__(self):
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment")
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel('gemini-2.5-flash')
+
+        # Free tier: 15 requests per minute
+        self.rpm_limit = int(os.getenv("GEMINI_RPM_LIMIT", 15))
+
+    def analyze_neighborhood(self, neighborhood_data: Dict) -> Optional[Dict]:
+        """
+        Returns structured analysis or None on error.
+        Sync wrapper around analyze_neighborhood_async.
+        """
+        return run_sync(self.analyze_neighborhood_async(neighborhood_data))
+
+    async def analyze_neighborhood_async(self, neighborhood_data: Dict) -> Optional[Dict]:
+        """
+        Async version of analyze_neighborhood.
+        The event loop stays free for other requests while Gemini generates.
+        """
+        prompt = self._build_analysis_prompt(neighborhood_data)
+
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text
+            await _gemini_limiter.acquire()
+            response = await self.model.generate_content_async(prompt, generation_config=ANALYSIS_CONFIG)
+            return orjson.loads(response.text)
+
+        except Exception as e:
+            print(f"Gemini analysis error: {e}")
+            return None
+
+    def _build_analysis_prompt(self, data: Dict) -> str:
+        """
+        Build a structured prompt for Gemini to analyze the neighborhood.
+        """
+        arrondissement = data.get("arrondissement", "Unknown")
+        address = data.get("address", "Unknown address")
+        transport = data.get("transport", {})
+        reddit = data.get("reddit", {})
 
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
+        # Build transport context
+        transport_context = ""
+        if transport:
+            connectivity_score = transport.get("connectivity_score", 0)
+            nearby_stations = transport.get("nearby_stations", [])
+            landmark_times = transport.get("landmark_travel_times", [])
 
-            return json.loads(result_text)
+            parts = [
+                "TRANSPORT DATA:",
+                f"- Connectivity Score: {connectivity_score}/5",
+                f"- Nearby Stations: {len(nearby_stations)} stations within 500m"
+            ]
+            if nearby_stations:
+                station_list = ", ".join([f"{s['name']} ({s['walk_time_minutes']}min walk)" for s in nearby_stations[:3]])
+                parts.append(f"  Including: {station_list}")
+            if landmark_times:
+                parts.append("- Travel times to landmarks:")
+                parts.extend(f"  * {lt['landmark']}: {lt['time']}" for lt in landmark_times)
+
+            transport_context = "\n\n" + "\n".join(parts)
+
+        # Build Reddit context
+        reddit_context = ""
+        if reddit and reddit.get("posts"):
+            reddit_context = "\n\n" + self._format_reddit_insights(reddit)
+
+        return ANALYSIS_PROMPT_TEMPLATE.format(
+            address=address,
+            arrondissement=arrondissement,
+            transport_context=transport_context,
+            reddit_context=reddit_context
+        )
+
+    def compare_addresses(self, address1_analysis: Dict, address2_analysis: Dict) -> Optional[Dict]:
+        """
+        Compare two addresses and provide recommendation.
+        """
+        prompt = COMPARISON_PROMPT_TEMPLATE.format(
+            address1_analysis=orjson.dumps(address1_analysis).decode(),
+            address2_analysis=orjson.dumps(address2_analysis).decode()
+        )
+
+        try:
+            response = self.model.generate_content(prompt, generation_config=COMPARISON_CONFIG)
+            return orjson.loads(response.text)
 
         except Exception as e:
             print(f"Gemini comparison error: {e}")
@@ -172,19 +256,19 @@ Return ONLY valid JSON."""
         if not reddit_data.get("posts"):
             return "No Reddit discussions found for this neighborhood."
 
-        formatted = "REDDIT INSIGHTS (Real resident experiences from r/paris):\n"
-        formatted += "Use these authentic voices to inform your ratings and overview.\n"
-        formatted += "IMPORTANT: Do NOT reference post numbers (like 'post 3' or 'post 8') in your analysis - just synthesize the overall sentiment.\n\n"
+        parts = [
+            "REDDIT INSIGHTS (Real resident experiences from r/paris):\n",
+            "Use these authentic voices to inform your ratings and overview.\n",
+            "IMPORTANT: Do NOT reference post numbers (like 'post 3' or 'post 8') in your analysis - just synthesize the overall sentiment.\n\n"
+        ]
 
         for i, post in enumerate(reddit_data["posts"][:8], 1):  # Top 8 posts
-            formatted += f"{i}. \"{post['title']}\"\n"
+            parts.append(f"{i}. \"{post['title']}\"\n")
 
-            if post.get("text") and len(post["text"]) > 50:
-                text = post["text"][:250]
-                if len(post["text"]) > 250:
-                    text += "..."
-                formatted += f"   {text}\n"
+            text = post.get("text")
+            if text and len(text) > 50:
+                parts.append(f"   {truncate(text, MAX_PROMPT_POST_CHARS)}\n")
 
-            formatted += f"   (Score: {post['score']}, {post['num_comments']} comments)\n\n"
+            parts.append(f"   (Score: {post['score']}, {post['num_comments']} comments)\n\n")
 
-        return formatted
+        return "".join(parts)
@@ -1,7 +1,14 @@
-import requests
+import atexit
+import httpx
 import time
 from typing import Optional, Dict
 
+from utils.rate_limit import RateLimiter
+from utils.retry import retry_after_seconds
+
+# Nominatim usage policy: max 1 request per second (shared by all workers)
+_nominatim_limiter = RateLimiter("nominatim_rl", 1.0)
+
 class GeocodingService:
 
     BASE_URL = "https://nominatim.openstreetmap.org/search"
@@ -11,6 +18,15 @@ class GeocodingService:
             "User-Agent": "Chez-vous/1.0 (Paris neighborhood finder)"
         }
 
+        # Pooled client keeps the TLS connection to Nominatim alive between lookups
+        self.client = httpx.Client(
+            http2=True,
+            headers=self.headers,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=32)
+        )
+        atexit.register(self.client.close)
+
     def geocode_address(self, address: str) -> Optional[Dict]:
         """
         Geocode any Paris address format using Nominatim with Paris bounds.
@@ -32,14 +48,14 @@ class GeocodingService:
         }
 
         try:
-            response = requests.get(
-                self.BASE_URL,
-                params=params,
-                headers=self.headers,
-                timeout=10
-            )
+            _nominatim_limiter.acquire()
+            response = self.client.get(self.BASE_URL, params=params)
 
-            time.sleep(1)  # Respect rate limit
+            # Throttled: wait as long as Nominatim asks, then retry once
+            if response.status_code == 429:
+                time.sleep(retry_after_seconds(response) or 1)
+                _nominatim_limiter.acquire()
+                response = self.client.get(self.BASE_URL, params=params)
 
             if response.status_code != 200:
                 print(f"Nominatim returned status {response.status_code}")
@@ -93,11 +109,12 @@ class GeocodingService:
         Extract arrondissement number from Paris postcode.
         75001 -> 1, 75020 -> 20, etc.
         """
-        if not postcode or not postcode.startswith("75"):
+        if not postcode or len(postcode) != 5 or not postcode.startswith("75") or not postcode.isdecimal():
             return None
 
-        try:
-            arr_num = int(postcode[3:])
-            return arr_num if 1 <= arr_num <= 20 else None
-        except (ValueError, IndexError):
-            return None
+        # 75116 is the second postcode of the 16th
+        if postcode == "75116":
+            return 16
+
+        arr_num = int(postcode[2:])
+        return arr_num if 1 <= arr_num <= 20 else None
@@ -1,6 +1,50 @@
-import requests
+import asyncio
+import atexit
+import httpx
+import logging
 import math
-from typing import Dict, List, Optional, Tuple
+import numpy as np
+import orjson
+import re
+from collections import OrderedDict
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from utils.aio import run_sync
+from utils.geo import haversine_batch
+from utils.retry import wait_retry_after
+
+_LOG = logging.getLogger(__name__)
+
+# Overpass lookups are memoized on coordinates rounded to this many decimals (~11 m)
+OVERPASS_GRID_DECIMALS = 4
+OVERPASS_MEMO_SIZE = 4096
+
+# Line refs in station tags, separated by ";" or "," (refs like "RER B" stay whole)
+_LINE_RE = re.compile(r"[^;,]+")
+
+# Metro, tram and stop-position nodes within {r} meters of ({lat}, {lon})
+_OVERPASS_TMPL = (
+    "[out:json];("
+    'node["railway"="station"]["station"="subway"](around:{r},{lat},{lon});'
+    'node["railway"="station"]["station"="light_rail"](around:{r},{lat},{lon});'
+    'node["railway"="stop"]["public_transport"="stop_position"](around:{r},{lat},{lon});'
+    ");out body;"
+)
+
+
+class StationArrays(NamedTuple):
+    """
+    Stations as returned by Overpass, stored column-wise: entry i of every field
+    describes station i (immutable, safe to share from the cache).
+    """
+    names: Tuple[str, ...]
+    lat_rad: np.ndarray
+    lon_rad: np.ndarray
+    lines: Tuple[Tuple[str, ...], ...]
+    lines_masks: Tuple[int, ...]
+    transport_types: Tuple[str, ...]
+
 
 class TransportService:
     """
@@ -20,103 +64,215 @@ class TransportService:
         "Champs-Élysées": (48.8698, 2.3078)
     }
 
+    # Flat landmark arrays (radians, in LANDMARKS order) for the batch distance kernel
+    _LANDMARK_NAMES = tuple(LANDMARKS.keys())
+    _LANDMARK_COORDS = np.radians(np.array(list(LANDMARKS.values()), dtype=np.float64))
+    _LANDMARK_LAT_RAD = np.ascontiguousarray(_LANDMARK_COORDS[:, 0])
+    _LANDMARK_LON_RAD = np.ascontiguousarray(_LANDMARK_COORDS[:, 1])
+
     # Metro lines that run late (past midnight on weekends)
     LATE_NIGHT_LINES = ["1", "2", "4", "6", "14"]
 
+    # Metro, RER and tram lines, each mapped to one bit of a station's lines_mask
+    PARIS_LINES = [
+        "1", "2", "3", "3bis", "4", "5", "6", "7", "7bis", "8", "9", "10", "11", "12", "13", "14",
+        "A", "B", "C", "D", "E",
+        "T1", "T2", "T3a", "T3b", "T4", "T5", "T6", "T7", "T8", "T9", "T10", "T11", "T12", "T13"
+    ]
+    _LINE_BIT = {line: 1 << i for i, line in enumerate(PARIS_LINES)}
+    _LATE_MASK = sum(map(_LINE_BIT.__getitem__, LATE_NIGHT_LINES))
+
+    # Walking speed: 5 km/h = 83.3 m/min
+    _INV_WALK_M_PER_MIN = 1.0 / 83.3
+
     def __init__(self):
         self.headers = {
             "User-Agent": "Chez-vous/1.0 (Paris neighborhood finder)"
         }
 
+        # Pooled HTTP/2 client for Overpass, only used from the shared event loop (utils.aio).
+        # Connection failures are retried by the transport, throttling by _post_overpass.
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=15.0,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(max_keepalive_connections=8)
+            )
+        )
+        atexit.register(lambda: run_sync(self.client.aclose()))
+
+        # Nearby addresses share one Overpass round-trip: (lat, lon, radius) -> stations
+        self._overpass_memo: OrderedDict = OrderedDict()
+
     def analyze_connectivity(self, latitude: float, longitude: float) -> Dict:
         """
         Complete transport analysis for a location.
         Returns nearby stations, travel times to landmarks, and connectivity score.
+        Sync wrapper around analyze_connectivity_async.
+        """
+        return run_sync(self.analyze_connectivity_async(latitude, longitude))
+
+    async def analyze_connectivity_async(self, latitude: float, longitude: float) -> Dict:
+        """
+        Async version of analyze_connectivity.
+        Landmark times are computed while the Overpass request is in flight.
         """
-        nearby_stations = self._get_nearby_stations(latitude, longitude)
-        landmark_times = self._calculate_landmark_times(latitude, longitude, nearby_stations)
-        connectivity_score = self._calculate_connectivity_score(nearby_stations, landmark_times)
+        stations_task = asyncio.create_task(self._get_nearby_stations_async(latitude, longitude))
+        landmark_minutes, landmark_modes = self._landmark_minutes_vec(latitude, longitude)
+        nearby_stations, lines_mask = await stations_task
+
+        connectivity_score = self._calculate_connectivity_score(nearby_stations, lines_mask, landmark_minutes)
 
         return {
             "nearby_stations": nearby_stations,
-            "landmark_travel_times": landmark_times,
+            "landmark_travel_times": self._calculate_landmark_times(landmark_minutes, landmark_modes),
             "connectivity_score": connectivity_score,
-            "has_late_night_service": self._has_late_night_service(nearby_stations)
+            "has_late_night_service": self._has_late_night_service(lines_mask)
         }
 
-    def _get_nearby_stations(self, lat: float, lon: float, radius: int = 500) -> List[Dict]:
+    async def _get_nearby_stations_async(self, lat: float, lon: float, radius: int = 500) -> Tuple[List[Dict], int]:
         """
         Find metro, RER, and tram stations within radius (meters).
+        Also returns the combined lines_mask of the returned stations.
         """
-        query = f"""
-        [out:json];
-        (
-          node["railway"="station"]["station"="subway"](around:{radius},{lat},{lon});
-          node["railway"="station"]["station"="light_rail"](around:{radius},{lat},{lon});
-          node["railway"="stop"]["public_transport"="stop_position"](around:{radius},{lat},{lon});
-        );
-        out body;
-        """
-
         try:
-            response = requests.post(
-                self.OVERPASS_URL,
-                data=query,
-                headers=self.headers,
-                timeout=15
+            nodes = await self._fetch_overpass(
+                round(lat, OVERPASS_GRID_DECIMALS),
+                round(lon, OVERPASS_GRID_DECIMALS),
+                radius
             )
-
-            if response.status_code != 200:
-                return []
-
-            data = response.json()
-            stations = []
-
-            for element in data.get("elements", []):
-                station_lat = element.get("lat")
-                station_lon = element.get("lon")
-                tags = element.get("tags", {})
-
-                name = tags.get("name", "Unknown Station")
-                lines = self._extract_lines(tags)
-
-                if station_lat and station_lon:
-                    distance = self._calculate_distance(lat, lon, station_lat, station_lon)
-                    walk_time = self._calculate_walk_time(distance)
-
-                    stations.append({
-                        "name": name,
-                        "lines": lines,
-                        "distance_meters": round(distance),
-                        "walk_time_minutes": walk_time,
-                        "transport_type": self._get_transport_type(tags)
-                    })
-
-            # Remove duplicates and sort by distance
-            stations = self._deduplicate_stations(stations)
-            stations.sort(key=lambda x: x["distance_meters"])
-
-            return stations[:10]  # Return closest 10 stations
-
         except Exception as e:
-            print(f"Error fetching stations: {e}")
-            return []
+            _LOG.warning("Error fetching stations: %s", e)
+            return [], 0
+
+        if not nodes.names:
+            return [], 0
+
+        # All station distances in one vectorized pass, then visit stations closest first
+        distances = _haversine_vec(lat, lon, nodes.lat_rad, nodes.lon_rad)
+        order = np.argsort(distances, kind="stable").tolist()
+        distances = distances.tolist()
+
+        # Build dicts only for the closest 10 distinct stations (same name = duplicate entry).
+        # Their combined lines_mask is shared by the score and late-night checks.
+        stations = {}
+        lines_mask = 0
+        for i in order:
+            name = nodes.names[i]
+            if name in stations:
+                continue
+
+            distance = distances[i]
+            stations[name] = {
+                "name": name,
+                "lines": list(nodes.lines[i]),
+                "distance_meters": round(distance),
+                "walk_time_minutes": self._calculate_walk_time(distance),
+                "transport_type": nodes.transport_types[i]
+            }
+            lines_mask |= nodes.lines_masks[i]
+
+            if len(stations) == 10:
+                break
+
+        return list(stations.values()), lines_mask
+
+    async def _fetch_overpass(self, lat: float, lon: float, radius: int) -> StationArrays:
+        """
+        Stations around a (grid-snapped) point, memoized in an LRU.
+        Raises on failure so errors are never memoized.
+        """
+        key = (lat, lon, radius)
+        nodes = self._overpass_memo.get(key)
+
+        if nodes is None:
+            nodes = await self._fetch_overpass_uncached(lat, lon, radius)
+            self._overpass_memo[key] = nodes
+            if len(self._overpass_memo) > OVERPASS_MEMO_SIZE:
+                self._overpass_memo.popitem(last=False)
+        else:
+            self._overpass_memo.move_to_end(key)
 
-    def _extract_lines(self, tags: Dict) -> List[str]:
+        return nodes
+
+    async def _fetch_overpass_uncached(self, lat: float, lon: float, radius: int) -> StationArrays:
+        """
+        Query Overpass for stations around a point.
+        """
+        query = _OVERPASS_TMPL.format(r=radius, lat=lat, lon=lon)
+
+        response = await self._post_overpass(query)
+        response.raise_for_status()
+
+        data = orjson.loads(response.content)
+        elements = data.get("elements", [])
+
+        # Coordinates go straight into arrays; elements without them are skipped
+        lats = np.empty(len(elements))
+        lons = np.empty(len(elements))
+        for i, element in enumerate(elements):
+            lats[i] = element.get("lat") or np.nan
+            lons[i] = element.get("lon") or np.nan
+        valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+
+        names, lines, lines_masks, transport_types = [], [], [], []
+        for i in valid.tolist():
+            tags = elements[i].get("tags", {})
+            station_lines = self._extract_lines(tags)
+            names.append(tags.get("name", "Unknown Station"))
+            lines.append(station_lines)
+            lines_masks.append(self._lines_mask(station_lines))
+            transport_types.append(self._get_transport_type(tags))
+
+        lat_rad = np.radians(lats[valid])
+        lon_rad = np.radians(lons[valid])
+        lat_rad.flags.writeable = False
+        lon_rad.flags.writeable = False
+
+        return StationArrays(
+            names=tuple(names),
+            lat_rad=lat_rad,
+            lon_rad=lon_rad,
+            lines=tuple(lines),
+            lines_masks=tuple(lines_masks),
+            transport_types=tuple(transport_types)
+        )
+
+    @retry(
+        retry=retry_if_exception_type(httpx.HTTPStatusError),
+        wait=wait_retry_after,
+        stop=stop_after_attempt(3),
+        reraise=True
+    )
+    async def _post_overpass(self, query: str) -> httpx.Response:
+        """POST a query, retrying when Overpass is throttling (429) or overloaded (5xx)."""
+        response = await self.client.post(self.OVERPASS_URL, content=query)
+
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+
+        return response
+
+    def _extract_lines(self, tags: Dict) -> Tuple[str, ...]:
         """Extract metro/RER line numbers from station tags."""
         lines = []
 
         # Check various tag formats
-        if "ref" in tags:
-            lines.append(tags["ref"])
-        if "line" in tags:
-            lines.append(tags["line"])
-        if "lines" in tags:
-            lines.extend(tags["lines"].split(";"))
+        for tag in ("ref", "line", "lines"):
+            value = tags.get(tag)
+            if value:
+                lines.extend(token.strip() for token in _LINE_RE.findall(value))
 
-        # Clean up line numbers
-        lines = [line.strip() for line in lines if line.strip()]
-        return list(set(lines))  # Remove duplicates
+        return tuple(dict.fromkeys(line for line in lines if line))  # Remove duplicates, keeping tag order
+
+    def _lines_mask(self, lines: Tuple[str, ...]) -> int:
+        """Bitmask of the known Paris lines in lines (unknown refs are ignored)."""
+        mask = 0
+        for line in lines:
+            mask |= self._LINE_BIT.get(line, 0)
+        return mask
 
     def _get_transport_type(self, tags: Dict) -> str:
         """Determine if station is metro, RER, tram, etc."""
@@ -129,37 +285,38 @@ class TransportService:
         else:
             return "Metro"
 
-    def _calculate_landmark_times(self, lat: float, lon: float, stations: List[Dict]) -> List[Dict]:
+    def _landmark_minutes_vec(self, lat: float, lon: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Estimated travel minutes to each landmark (in _LANDMARK_NAMES order),
+        and the travel mode behind each estimate ("walk" or "metro").
+        """
+        distances = np.empty(len(self._LANDMARK_NAMES))
+        haversine_batch(math.radians(lat), math.radians(lon), self._LANDMARK_LAT_RAD, self._LANDMARK_LON_RAD, distances)
+
+        # If very close (1.5km), just walk; otherwise estimate metro travel:
+        # rough estimate of 10 min walk to station + distance/600m per min on metro
+        # Both estimates are computed for every landmark and selected branch-free
+        walkable = distances < 1500
+        walk = np.maximum(1, (distances * self._INV_WALK_M_PER_MIN + 0.5).astype(np.int32))
+        metro = 10 + (distances / 600).astype(np.int32)
+
+        return np.where(walkable, walk, metro), np.where(walkable, "walk", "metro")
+
+    def _calculate_landmark_times(self, minutes: np.ndarray, modes: np.ndarray) -> List[Dict]:
         """
-        Calculate estimated travel times to major landmarks.
+        Format travel times to major landmarks for the API response.
         Returns list with landmark name and time estimate.
         """
-        times = []
-
-        for landmark_name, (landmark_lat, landmark_lon) in self.LANDMARKS.items():
-            distance = self._calculate_distance(lat, lon, landmark_lat, landmark_lon)
-
-            # If very close, just walk
-            if distance < 1500:  # 1.5km
-                walk_time = self._calculate_walk_time(distance)
-                times.append({
-                    "landmark": landmark_name,
-                    "time": f"{walk_time} min walk",
-                    "estimated_minutes": walk_time
-                })
-            else:
-                # Estimate metro travel
-                # Rough estimate: 10 min walk to station + distance/600m per min on metro
-                metro_time = 10 + int(distance / 600)
-                times.append({
-                    "landmark": landmark_name,
-                    "time": f"{metro_time} min metro",
-                    "estimated_minutes": metro_time
-                })
-
-        return times
-
-    def _calculate_connectivity_score(self, stations: List[Dict], landmark_times: List[Dict]) -> int:
+        return [
+            {
+                "landmark": landmark_name,
+                "time": f"{landmark_minutes} min {mode}",
+                "estimated_minutes": landmark_minutes
+            }
+            for landmark_name, landmark_minutes, mode in zip(self._LANDMARK_NAMES, minutes.tolist(), modes.tolist())
+        ]
+
+    def _calculate_connectivity_score(self, stations: List[Dict], lines_mask: int, landmark_minutes: np.ndarray) -> int:
         """
         Calculate connectivity score (1-5) based on:
         - Number of nearby stations
@@ -176,20 +333,18 @@ class TransportService:
         elif len(stations) >= 1:
             score += 1
 
-        # Line diversity (max 2 points)
-        all_lines = set()
-        for station in stations:
-            all_lines.update(station.get("lines", []))
+        # Line diversity (max 2 points): distinct lines = set bits across all stations
+        line_count = lines_mask.bit_count()
 
-        if len(all_lines) >= 5:
+        if line_count >= 5:
             score += 2
-        elif len(all_lines) >= 3:
+        elif line_count >= 3:
             score += 1.5
-        elif len(all_lines) >= 1:
+        elif line_count >= 1:
             score += 1
 
         # Average landmark time (max 1 point)
-        avg_time = sum(t["estimated_minutes"] for t in landmark_times) / len(landmark_times)
+        avg_time = landmark_minutes.mean()
         if avg_time <= 15:
             score += 1
         elif avg_time <= 25:
@@ -197,37 +352,21 @@ class TransportService:
 
         return min(5, round(score))
 
-    def _has_late_night_service(self, stations: List[Dict]) -> bool:
+    def _has_late_night_service(self, lines_mask: int) -> bool:
         """Check if any nearby station has late-night metro service."""
-        for station in stations:
-            for line in station.get("lines", []):
-                if line in self.LATE_NIGHT_LINES:
-                    return True
-        return False
+        return bool(lines_mask & self._LATE_MASK)
 
-    def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate distance between two coordinates in meters using Haversine formula."""
-        R = 6371000  # Earth's radius in meters
-
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        delta_phi = math.radians(lat2 - lat1)
-        delta_lambda = math.radians(lon2 - lon1)
-
-        a = math.sin(delta_phi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    def _calculate_walk_time(self, distance_meters: float) -> int:
+        """Calculate walking time (rounded to the nearest minute, at least 1)."""
+        minutes = int(distance_meters * self._INV_WALK_M_PER_MIN + 0.5)
+        return 1 if minutes < 1 else minutes
 
-        return R * c
 
-    def _calculate_walk_time(self, distance_meters: float) -> int:
-        """Calculate walking time. Average speed: 5 km/h = 83.3 m/min."""
-        return max(1, round(distance_meters / 83.3))
-
-    def _deduplicate_stations(self, stations: List[Dict]) -> List[Dict]:
-        """Remove duplicate stations (same name, different entries)."""
-        seen = {}
-        for station in stations:
-            name = station["name"]
-            if name not in seen or station["distance_meters"] < seen[name]["distance_meters"]:
-                seen[name] = station
-        return list(seen.values())
+def _haversine_vec(lat: float, lon: float, lat_rad: np.ndarray, lon_rad: np.ndarray) -> np.ndarray:
+    """
+    Distances in meters from (lat, lon) in degrees to each point of the
+    (lat_rad, lon_rad) arrays, in radians.
+    """
+    distances = np.empty(len(lat_rad))
+    haversine_batch(math.radians(lat), math.radians(lon), lat_rad, lon_rad, distances)
+    return distances
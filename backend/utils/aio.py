@@ -0,0 +1,28 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the shared background event loop, starting it on first use.
+    Long-lived async clients (HTTP sessions) are bound to this loop so they
+    can be reused across Flask requests.
+    """
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="aio-loop", daemon=True)
+            thread.start()
+
+    return _loop
+
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """Run a coroutine on the shared loop and block until it completes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
@@ -1,13 +1,78 @@
 import sqlite3
-import json
+import orjson
 import os
-from datetime import datetime, timedelta
-from typing import Optional, Any
+import redis
+import threading
+import time
+from blake3 import blake3
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Any, Tuple
+
+from utils.redis_client import get_redis
+
+# Applied once to each new connection
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Rows are keyed by a 16-byte BLAKE3 digest of the cache key (fixed-size, compact
+# index). The readable key is kept alongside for debugging only.
+_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS cache (
+        k BLOB PRIMARY KEY,
+        key TEXT NOT NULL,
+        value BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+"""
+# Older databases used the key itself as TEXT primary key, stored values as JSON
+# TEXT or expiry as a local timestamp string; all are rebuilt into the current layout.
+_MIGRATE_LEGACY_SCHEMA = """
+    ALTER TABLE cache RENAME TO cache_legacy;
+    {create_table};
+    INSERT OR REPLACE INTO cache (k, key, value, created_at, expires_at)
+        SELECT cache_key_hash(key), key, CAST(value AS BLOB), created_at, cache_epoch(expires_at)
+        FROM cache_legacy;
+    DROP TABLE cache_legacy;
+"""
+# In-process L1 in front of SQLite/Redis. Entries live at most MEMORY_MAX_AGE_SECONDS
+# so writes and clears made by other workers are picked up reasonably quickly.
+MEMORY_CAPACITY = 1024
+MEMORY_MAX_AGE_SECONDS = 300
+
+# expires_at is a unix epoch; the current time is bound as a parameter
+_GET = "SELECT value, expires_at FROM cache WHERE k = ? AND expires_at > ?"
+_SET = "INSERT OR REPLACE INTO cache (k, key, value, expires_at) VALUES (?, ?, ?, ?)"
+_DELETE = "DELETE FROM cache WHERE k = ?"
+_CLEAR_EXPIRED = "DELETE FROM cache WHERE expires_at <= ?"
+_CLEAR_ALL = "DELETE FROM cache"
+
+
+def _hash_key(key: str) -> bytes:
+    """16-byte BLAKE3 digest used as the SQLite primary key."""
+    return blake3(key.encode()).digest(length=16)
+
+
+def _legacy_epoch(expires_at: Any) -> float:
+    """Convert a legacy expiry (local timestamp string) to a unix epoch."""
+    if isinstance(expires_at, (int, float)):
+        return float(expires_at)
+    return datetime.fromisoformat(expires_at).timestamp()
+
 
 class Cache:
     """
     Simple SQLite-based cache to store API responses and scraped data.
     Reduces API calls and respects rate limits.
+    Each process keeps one open connection (WAL mode, autocommit), shared
+    under a lock; under gevent a per-thread connection would be per greenlet.
+    Recent entries are also kept decoded in memory (LRU).
     """
 
     def __init__(self, db_path: Optional[str] = None):
@@ -15,43 +80,104 @@ class Cache:
             db_path = os.getenv("DATABASE_PATH", "./cache.db")
 
         self.db_path = db_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid = None
+        self._db_lock = threading.Lock()
+        self._init_memory()
         self._init_db()
 
+    def _init_memory(self) -> None:
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._mem_cap = MEMORY_CAPACITY
+        self._lock = threading.Lock()
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        """Return a live in-memory entry, or None."""
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            return entry[1]
+
+    def _memory_put(self, key: str, value: Any, expires_epoch: float) -> None:
+        """Store an entry in memory, evicting the least recently used beyond capacity."""
+        expires_epoch = min(expires_epoch, time.time() + MEMORY_MAX_AGE_SECONDS)
+        with self._lock:
+            self._mem[key] = (expires_epoch, value)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self._mem_cap:
+                self._mem.popitem(last=False)
+
+    def _memory_discard(self, key: Optional[str] = None) -> None:
+        """Drop one in-memory entry, or all of them when key is None."""
+        with self._lock:
+            if key is None:
+                self._mem.clear()
+            else:
+                self._mem.pop(key, None)
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        """
+        Hold the process's connection, opening and configuring it on first use
+        (and again after a fork, since a connection must not cross processes).
+        """
+        with self._db_lock:
+            if self._db is None or self._db_pid != os.getpid():
+                conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+                for pragma in _PRAGMAS:
+                    conn.execute(pragma)
+                self._db = conn
+                self._db_pid = os.getpid()
+
+            yield self._db
+
     def _init_db(self):
         """Initialize the cache database table"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._conn() as conn:
+            conn.execute(_CREATE_TABLE)
+            self._migrate_legacy_schema(conn)
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS cache (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP NOT NULL
-            )
-        """)
-
-        conn.commit()
-        conn.close()
+    def _migrate_legacy_schema(self, conn: sqlite3.Connection) -> None:
+        """
+        One-shot migration for databases from older schemas.
+        Keys are re-hashed and expiries converted to epochs; stored JSON bytes
+        are kept as-is (orjson reads them directly).
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(cache)")}
+            if "k" not in columns or columns.get("expires_at") != "REAL":
+                conn.create_function("cache_key_hash", 1, _hash_key, deterministic=True)
+                conn.create_function("cache_epoch", 1, _legacy_epoch, deterministic=True)
+                for statement in _MIGRATE_LEGACY_SCHEMA.format(create_table=_CREATE_TABLE).split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
 
     def get(self, key: str) -> Optional[Any]:
         """
         Get a value from cache if it exists and hasn't expired.
         Returns None if not found or expired.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        value = self._memory_get(key)
+        if value is not None:
+            return value
 
-        cursor.execute("""
-            SELECT value, expires_at FROM cache
-            WHERE key = ? AND expires_at > datetime('now')
-        """, (key,))
-
-        result = cursor.fetchone()
-        conn.close()
+        with self._conn() as conn:
+            result = conn.execute(_GET, (_hash_key(key), time.time())).fetchone()
 
         if result:
-            return json.loads(result[0])
+            value = orjson.loads(result[0])
+            self._memory_put(key, value, result[1])
+            return value
 
         return None
 
@@ -63,48 +189,143 @@ class Cache:
         if ttl_hours is None:
             ttl_hours = int(os.getenv("CACHE_EXPIRY_HOURS", 24))
 
-        expires_at = datetime.now() + timedelta(hours=ttl_hours)
+        expires_at = time.time() + ttl_hours * 3600.0
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        row = (_hash_key(key), key, orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY), expires_at)
 
-        cursor.execute("""
-            INSERT OR REPLACE INTO cache (key, value, expires_at)
-            VALUES (?, ?, ?)
-        """, (key, json.dumps(value), expires_at))
+        with self._conn() as conn:
+            conn.execute(_SET, row)
+        self._memory_put(key, value, expires_at)
 
-        conn.commit()
-        conn.close()
+    def set_many(self, items: Dict[str, Any], ttl_hours: Optional[int] = None) -> None:
+        """
+        Store several values in a single transaction (one commit for all).
+        Same TTL rules as set().
+        """
+        if not items:
+            return
 
-    def delete(self, key: str) -> None:
-        """Delete a specific key from cache"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if ttl_hours is None:
+            ttl_hours = int(os.getenv("CACHE_EXPIRY_HOURS", 24))
+
+        expires_at = time.time() + ttl_hours * 3600.0
+        rows = [
+            (_hash_key(key), key, orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY), expires_at)
+            for key, value in items.items()
+        ]
 
-        cursor.execute("DELETE FROM cache WHERE key = ?", (key,))
+        with self._conn() as conn:
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(_SET, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
 
-        conn.commit()
-        conn.close()
+        for key, value in items.items():
+            self._memory_put(key, value, expires_at)
+
+    def delete(self, key: str) -> None:
+        """Delete a specific key from cache"""
+        with self._conn() as conn:
+            conn.execute(_DELETE, (_hash_key(key),))
+        self._memory_discard(key)
 
     def clear_expired(self) -> int:
         """Remove all expired entries. Returns number of deleted entries."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._conn() as conn:
+            return conn.execute(_CLEAR_EXPIRED, (time.time(),)).rowcount
 
-        cursor.execute("DELETE FROM cache WHERE expires_at <= datetime('now')")
-        deleted = cursor.rowcount
+    def clear_all(self) -> None:
+        """Clear all cache entries"""
+        with self._conn() as conn:
+            conn.execute(_CLEAR_ALL)
+        self._memory_discard()
 
-        conn.commit()
-        conn.close()
 
-        return deleted
+class RedisCache(Cache):
+    """
+    Redis-backed cache shared by every worker process.
+    Same interface as Cache; expiry is handled by Redis TTLs.
+    """
+
+    KEY_PREFIX = "chezvous:"
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._init_memory()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a value from cache if it exists and hasn't expired.
+        Returns None if not found or expired.
+        """
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.get(self.KEY_PREFIX + key)
+        pipeline.pttl(self.KEY_PREFIX + key)
+        value, ttl_ms = pipeline.execute()
+
+        if value is not None:
+            value = orjson.loads(value)
+            # The memory copy expires with the key (a negative PTTL means no expiry)
+            expires_epoch = time.time() + (ttl_ms / 1000 if ttl_ms >= 0 else MEMORY_MAX_AGE_SECONDS)
+            self._memory_put(key, value, expires_epoch)
+            return value
+
+        return None
+
+    def set(self, key: str, value: Any, ttl_hours: Optional[int] = None) -> None:
+        """
+        Store a value in cache with optional TTL in hours.
+        Default TTL is 24 hours.
+        """
+        if ttl_hours is None:
+            ttl_hours = int(os.getenv("CACHE_EXPIRY_HOURS", 24))
+
+        self.client.setex(self.KEY_PREFIX + key, ttl_hours * 3600, orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY))
+        self._memory_put(key, value, time.time() + ttl_hours * 3600)
+
+    def set_many(self, items: Dict[str, Any], ttl_hours: Optional[int] = None) -> None:
+        """Store several values in one round-trip (pipelined SETEX)."""
+        if not items:
+            return
+
+        if ttl_hours is None:
+            ttl_hours = int(os.getenv("CACHE_EXPIRY_HOURS", 24))
+
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipeline.setex(self.KEY_PREFIX + key, ttl_hours * 3600, orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY))
+        pipeline.execute()
+
+        for key, value in items.items():
+            self._memory_put(key, value, time.time() + ttl_hours * 3600)
+
+    def delete(self, key: str) -> None:
+        """Delete a specific key from cache"""
+        self.client.delete(self.KEY_PREFIX + key)
+        self._memory_discard(key)
+
+    def clear_expired(self) -> int:
+        """Redis evicts expired keys itself, so there is nothing to remove."""
+        return 0
 
     def clear_all(self) -> None:
         """Clear all cache entries"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        keys = list(self.client.scan_iter(match=f"{self.KEY_PREFIX}*"))
+        if keys:
+            self.client.delete(*keys)
+        self._memory_discard()
 
-        cursor.execute("DELETE FROM cache")
 
-        conn.commit()
-        conn.close()
+def create_cache() -> Cache:
+    """Use Redis when REDIS_URL is configured, otherwise the local SQLite cache."""
+    client = get_redis()
+    if client is not None:
+        return RedisCache(client)
+    return Cache()
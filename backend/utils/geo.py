@@ -0,0 +1,51 @@
+import math
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to math / NumPy
+    njit = None
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance in meters between two coordinates in degrees (Haversine formula)."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_M * c
+
+
+def _haversine_batch_loop(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, out: np.ndarray) -> None:
+    """Scalar kernel over arrays, all in radians; compiled by numba."""
+    cos_lat = math.cos(lat)
+    for i in range(lats.shape[0]):
+        a = math.sin((lats[i] - lat) / 2) ** 2 + cos_lat * math.cos(lats[i]) * math.sin((lons[i] - lon) / 2) ** 2
+        out[i] = EARTH_RADIUS_M * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _haversine_batch_numpy(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, out: np.ndarray) -> None:
+    """Vectorized kernel over arrays, all in radians."""
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    out[:] = EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+# Public kernels:
+#   haversine_m(lat1, lon1, lat2, lon2) -> meters, coordinates in degrees
+#   haversine_batch(lat, lon, lats, lons, out) fills out with meters, all in radians
+if njit is not None:
+    haversine_m = njit(cache=True, fastmath=True)(_haversine_m)
+    haversine_batch = njit(cache=True, fastmath=True)(_haversine_batch_loop)
+
+    # Compile (or load from cache) now so the first request doesn't pay for it
+    haversine_m(0.0, 0.0, 0.0, 0.0)
+    haversine_batch(0.0, 0.0, np.zeros(1), np.zeros(1), np.empty(1))
+else:
+    haversine_m = _haversine_m
+    haversine_batch = _haversine_batch_numpy
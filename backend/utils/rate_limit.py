@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from utils.redis_client import get_redis
+
+
+class RateLimiter:
+    """
+    Allows one call per `interval` seconds and only waits when that budget is
+    exceeded. The budget is shared by all workers through Redis when REDIS_URL
+    is configured, otherwise it is per process.
+    """
+
+    def __init__(self, key: str, interval: float):
+        self.key = key
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        """Block until a call is allowed."""
+        client = get_redis()
+        if client is not None:
+            self._acquire_shared(client)
+        else:
+            self._acquire_local()
+
+    def _acquire_shared(self, client) -> None:
+        # The key exists for `interval` after each call; whoever sets it gets the slot
+        interval_ms = int(self.interval * 1000)
+        while not client.set(self.key, 1, nx=True, px=interval_ms):
+            wait_ms = client.pttl(self.key)
+            time.sleep(max(wait_ms, 1) / 1000)
+
+    def _acquire_local(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AsyncCallLimiter:
+    """
+    Allows at most `calls` calls in any `period` seconds (per process).
+    Waits with asyncio.sleep, so neither the event loop nor its executor
+    threads are tied up while throttled. Use from the shared loop (utils.aio).
+    """
+
+    def __init__(self, calls: int, period: float):
+        self.calls = calls
+        self.period = period
+        self._lock = asyncio.Lock()
+        self._recent = deque()
+
+    async def acquire(self) -> None:
+        """Wait until a call is allowed."""
+        async with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= self.period:
+                self._recent.popleft()
+
+            if len(self._recent) >= self.calls:
+                await asyncio.sleep(self._recent[0] + self.period - now)
+                self._recent.popleft()
+
+            self._recent.append(time.monotonic())
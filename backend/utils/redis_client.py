@@ -0,0 +1,23 @@
+import os
+import redis
+from typing import Optional
+
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """
+    Return a shared Redis client, or None if REDIS_URL is not configured.
+    All callers share one connection pool per process.
+    """
+    global _client
+
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+
+    if _client is None:
+        pool = redis.ConnectionPool.from_url(url)
+        _client = redis.Redis(connection_pool=pool)
+
+    return _client
@@ -0,0 +1,33 @@
+import httpx
+from tenacity import RetryCallState, wait_exponential_jitter
+from typing import Optional
+
+# Never wait longer than this on a single retry, whatever the server asks for
+MAX_RETRY_WAIT_SECONDS = 5.0
+
+_backoff = wait_exponential_jitter(initial=0.5, max=MAX_RETRY_WAIT_SECONDS)
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """
+    Delay requested by a throttled response (Retry-After or Reddit's
+    X-Ratelimit-Reset), capped at MAX_RETRY_WAIT_SECONDS. None if absent.
+    """
+    value = response.headers.get("Retry-After") or response.headers.get("X-Ratelimit-Reset")
+
+    try:
+        return min(float(value), MAX_RETRY_WAIT_SECONDS)
+    except (TypeError, ValueError):
+        return None
+
+
+def wait_retry_after(retry_state: RetryCallState) -> float:
+    """tenacity wait: honour the server's requested delay, else exponential backoff with jitter."""
+    error = retry_state.outcome.exception()
+
+    if isinstance(error, httpx.HTTPStatusError):
+        delay = retry_after_seconds(error.response)
+        if delay is not None:
+            return delay
+
+    return _backoff(retry_state)
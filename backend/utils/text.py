@@ -0,0 +1,5 @@
+def truncate(text: str, max_chars: int) -> str:
+    """Cut text to max_chars, adding an ellipsis if anything was removed."""
+    if len(text) > max_chars:
+        return text[:max_chars] + "..."
+    return text
@@ -0,0 +1,5 @@
+from gevent import monkey
+monkey.patch_all()
+
+# Imported after patching so sockets and time.sleep yield cooperatively
+from app import app  # noqa: E402